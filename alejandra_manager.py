@@ -8,15 +8,33 @@ Sistema de gestión de credenciales con interfaz web moderna
 # IMPORTS - todas las librerías que necesitamos para que esto funcione
 # ============================================================
 
-import os           # para interactuar con el sistema operativo (aunque no lo usamos directo aquí)
-import json         # para leer y escribir archivos .json (donde guardamos todo)
+import os           # para interactuar con el sistema operativo (os.replace para guardar JSON de forma atómica)
+import json         # para leer y escribir archivos .json si orjson no está instalado
+try:
+    import orjson   # para leer y escribir archivos .json (donde guardamos todo), mucho más rápido que json
+except ImportError:
+    orjson = None
 import secrets      # para generar tokens seguros (más seguro que random)
-import hashlib      # para hacer hash de contraseñas (convertirlas en cadena irreversible)
+import hashlib      # para hacer hash de contraseñas con scrypt (convertirlas en cadena irreversible)
+import hmac         # para comparar hashes en tiempo constante
 import base64       # para encoding en base64 si llegara a necesitarse
+import time         # para esperar entre escrituras agrupadas al disco
+import atexit       # para forzar la escritura pendiente al cerrar la app
+import threading    # para el hilo que escribe los JSON en segundo plano
+import shutil       # para copiar los archivos subidos al disco por bloques
+import io           # para detectar streams que no tienen un archivo real detrás
+import tempfile     # para reconocer los archivos temporales donde Werkzeug guarda las subidas
 from pathlib import Path          # manejo moderno de rutas de carpetas/archivos
 from datetime import datetime     # para guardar la fecha en que se crea algo
-from flask import Flask, render_template, request, jsonify, send_from_directory  # el framework web
+from functools import lru_cache   # para memorizar resultados de funciones costosas
+from concurrent.futures import ThreadPoolExecutor  # pool de hilos para guardar/borrar archivos en paralelo
+from collections import OrderedDict, Counter  # OrderedDict: caches LRU / Counter: contador de cuentas por uid
+from mmap import mmap, ACCESS_READ   # para leer imágenes mapeando el archivo a memoria
+import mimetypes    # para saber el Content-Type de una imagen por su extensión
+import stat         # para distinguir archivos normales de carpetas
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, abort  # el framework web
 from werkzeug.utils import secure_filename  # utilidad para limpiar nombres de archivos subidos
+from werkzeug.security import safe_join     # une rutas sin dejar salir de la carpeta base (evita "../")
 import logging          # para controlar qué mensajes se muestran en consola
 import yrz_cipher as yrz  # nuestro módulo de encriptación personalizado
 
@@ -39,6 +57,11 @@ log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)       # solo mostrar errores, no info ni warnings
 app.logger.setLevel(logging.ERROR)
 
+# Tamaño máximo de un request (imágenes incluidas)
+# Si alguien sube algo más grande, Flask corta la subida con un error 413
+# en vez de seguir leyendo datos que igual vamos a rechazar
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MiB
+
 
 # ============================================================
 # RUTAS DE ARCHIVOS Y CARPETAS
@@ -60,8 +83,8 @@ IMG_AVATARS  = USER_DOCS / "img" / "avatars"    # fotos de perfil de usuarios
 IMG_SRC      = USER_DOCS / "img" / "src"        # imágenes del sistema (ej: default.svg)
 
 # Set de extensiones que aceptamos para subir imágenes
-# Usamos set (llaves {}) en vez de lista porque la búsqueda en set es más rápida
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'svg', 'gif'}
+# Usamos frozenset en vez de lista porque la búsqueda es más rápida y nadie puede modificarlo
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'webp', 'svg', 'gif'})
 
 
 # ============================================================
@@ -69,11 +92,22 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'svg', 'gif'}
 # Estas funciones las usamos en muchos lugares, por eso las separamos
 # ============================================================
 
+# Se pone en True después de la primera llamada a init_directories()
+_INITIALIZED = False
+
+
 def init_directories():
     """
     Crea todas las carpetas necesarias si no existen todavía.
     Se llama una sola vez al arrancar la app desde main.py
+
+    Si se vuelve a llamar (tests, reinicios del servidor) no hace nada:
+    las carpetas ya se crearon en la primera llamada.
     """
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
+
     # mkdir con parents=True crea todas las carpetas intermedias si no existen
     # exist_ok=True evita que tire error si la carpeta ya existe
     USER_DOCS.mkdir(parents=True, exist_ok=True)
@@ -93,19 +127,254 @@ def init_directories():
   <path d="M 50 140 Q 100 120 150 140" fill="#666"/>
 </svg>''')
 
+    # Precargamos los tres JSON en el cache (y armamos sus índices) al arrancar,
+    # así el primer request ya los encuentra en memoria y no tiene que leer ni parsear nada
+    # Si después alguien los edita a mano, load_json lo nota por el mtime y los relee
+    for filepath in (CREDENTIALS_FILE, SERVICES_FILE, ACCOUNTS_FILE):
+        load_json(filepath, {})
+
+    _INITIALIZED = True
+
+
+# Bytes aleatorios seguros leídos del sistema en bloques de 4 KiB
+# Cada id o salt toma su parte de este buffer en vez de pedirle bytes al SO uno por uno
+# _rng_pos marca hasta dónde ya se repartió el bloque actual
+_rng_buf = b''
+_rng_pos = 0
+_rng_lock = threading.Lock()
+
+
+def token_bytes(n: int) -> bytes:
+    """
+    Devuelve n bytes aleatorios criptográficamente seguros.
 
-def hash_password(password: str) -> str:
+    os.urandom es la misma fuente que usa el módulo secrets, pero acá
+    la leemos de a 4 KiB y vamos repartiendo: una llamada al sistema
+    alcanza para cientos de ids. El lock evita que dos hilos reciban
+    los mismos bytes.
     """
-    Convierte una contraseña en texto plano a un hash SHA-256.
+    global _rng_buf, _rng_pos
+    with _rng_lock:
+        if _rng_pos + n > len(_rng_buf):
+            # Bloque agotado: pedimos uno nuevo (lo que sobraba del viejo se descarta)
+            _rng_buf = os.urandom(max(4096, n))
+            _rng_pos = 0
+        # Cortamos desde la posición y la avanzamos: cada byte se entrega una sola vez
+        # (antes borrábamos el principio del buffer, lo que corría todo el resto cada vez)
+        out = _rng_buf[_rng_pos:_rng_pos + n]
+        _rng_pos += n
+    return out
+
+
+def token_hex(n: int) -> str:
+    """Igual que secrets.token_hex(n) pero sacando los bytes de token_bytes()."""
+    return token_bytes(n).hex()
+
+
+# Parámetros de scrypt (KDF "memory-hard" incluido en hashlib, no requiere dependencias)
+# n=2**14, r=8 -> cada hash usa ~16 MiB de RAM, lo que hace muy caro un ataque por fuerza bruta
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Cache LRU de verificaciones exitosas: (username, fast_digest(password)) -> hash guardado en disco
+# Así un mismo login repetido no vuelve a pagar el costo del KDF
+# Tiene tamaño máximo: cuando se llena, sacamos la verificación usada hace más tiempo
+_verifier_cache: OrderedDict = OrderedDict()
+_verifier_lock = threading.Lock()
+VERIFIER_CACHE_SIZE = 128
+
+
+# Referencias directas a los constructores de hash, para no buscarlos en el módulo en cada llamada
+_sha256 = hashlib.sha256
+_blake2b = hashlib.blake2b
+
+
+def fast_digest(data: bytes) -> str:
+    """
+    Huella rápida de 256 bits con BLAKE2b.
+
+    NO sirve para guardar contraseñas (para eso está hash_password con scrypt),
+    solo para claves de cache y nombres derivados donde no hace falta un KDF.
+    BLAKE2b es más rápido que SHA-256 con la misma resistencia a colisiones.
+    """
+    return _blake2b(data, digest_size=32).hexdigest()
+
+
+def _scrypt(password: str, salt: bytes, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> str:
+    """Deriva la clave con scrypt y la devuelve en hexadecimal."""
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32).hex()
+
+
+def hash_password(password: str) -> dict:
+    """
+    Convierte una contraseña en texto plano a un hash scrypt con salt aleatorio.
 
     El hash es un proceso de una sola vía: puedes convertir "hola123" -> "abc...xyz"
     pero NO puedes convertir "abc...xyz" -> "hola123" de vuelta.
     Por eso nunca guardamos la contraseña real, solo el hash.
-    Cuando el usuario hace login, hasheamos lo que escribe y comparamos hashes.
+
+    El salt es distinto para cada usuario, así dos contraseñas iguales
+    nunca producen el mismo hash. Guardamos también los parámetros
+    para poder subir el costo en el futuro sin romper los hashes viejos.
     """
-    # .encode() convierte el string a bytes (SHA-256 trabaja con bytes, no strings)
-    # .hexdigest() devuelve el resultado como string hexadecimal (más fácil de guardar)
-    return hashlib.sha256(password.encode()).hexdigest()
+    salt = token_bytes(16)
+    return {
+        'algo': 'scrypt',
+        'n': SCRYPT_N,
+        'r': SCRYPT_R,
+        'p': SCRYPT_P,
+        'salt': salt.hex(),
+        'hash': _scrypt(password, salt)
+    }
+
+
+def verify_password(username: str, password: str, stored) -> bool:
+    """
+    Compara una contraseña en texto plano con el hash guardado en disco.
+
+    Soporta dos formatos:
+        - dict {'algo': 'scrypt', ...} -> formato actual
+        - str (hex de SHA-256)          -> formato viejo, se migra en el próximo login
+
+    Si esta misma combinación usuario/contraseña ya se verificó contra
+    este mismo hash, devolvemos True sin volver a correr el KDF.
+    """
+    # Formato viejo: SHA-256 sin salt
+    # compare_digest tarda lo mismo sin importar en qué carácter difieren los hashes
+    if isinstance(stored, str):
+        ok = hmac.compare_digest(stored, _sha256(password.encode('utf-8')).hexdigest())
+        if not ok:
+            # Un fallo con SHA-256 vuelve casi al instante, pero un usuario inexistente paga
+            # un scrypt entero (_DUMMY_HASH): sin esto, el tiempo de respuesta delataría que
+            # el usuario existe (y que no migró). Corremos el mismo scrypt para igualarlos
+            _scrypt(password, bytes.fromhex(_DUMMY_HASH['salt']),
+                    _DUMMY_HASH['n'], _DUMMY_HASH['r'], _DUMMY_HASH['p'])
+        return ok
+
+    key = (username, fast_digest(password.encode()))
+    with _verifier_lock:
+        if _verifier_cache.get(key) == stored['hash']:
+            _verifier_cache.move_to_end(key)  # la marcamos como recién usada
+            return True
+
+    salt = bytes.fromhex(stored['salt'])
+    ok = hmac.compare_digest(_scrypt(password, salt, stored['n'], stored['r'], stored['p']), stored['hash'])
+    if ok:
+        with _verifier_lock:
+            _verifier_cache[key] = stored['hash']
+            _verifier_cache.move_to_end(key)
+            if len(_verifier_cache) > VERIFIER_CACHE_SIZE:
+                _verifier_cache.popitem(last=False)  # sacamos la menos usada
+    return ok
+
+
+# Cache en memoria de los JSON ya leídos: ruta -> (mtime_ns, datos)
+# Si el archivo no cambió en disco desde la última lectura, no lo volvemos a parsear
+_json_cache: dict[Path, tuple[int, dict]] = {}
+
+# Archivos con cambios en memoria que todavía no se escribieron a disco
+_dirty: set[Path] = set()
+
+# Archivos que el hilo de fondo está escribiendo en este momento
+# Mientras tanto el disco todavía tiene la versión vieja, así que la buena es la de memoria
+_writing: set[Path] = set()
+
+# waitress atiende varios requests a la vez, así que todo lo que se lee-modifica-escribe
+# (los dicts cacheados, los índices, _json_cache y _dirty) se hace con este lock tomado
+# Es RLock (reentrante): un handler que ya lo tiene puede llamar a load_json/save_json,
+# que lo vuelven a tomar, sin bloquearse a sí mismo
+# Regla: el dict que se modifica se pide con load_json DENTRO del lock. Uno leído antes
+# (por ejemplo antes de un hash o de copiar un archivo) puede haber quedado viejo si el
+# archivo se recargó en el medio, y guardarlo pisaría los cambios de otros requests
+_json_lock = threading.RLock()
+_flush_lock = threading.Lock()  # evita que dos hilos escriban el mismo archivo a la vez
+_flush_event = threading.Event()
+
+# Cada cuánto (en segundos) como máximo se escribe un archivo a disco
+# Varias escrituras seguidas dentro de esta ventana se juntan en una sola
+FLUSH_INTERVAL = 0.05
+
+
+# Índices secundarios para no recorrer todo el JSON en cada request
+# Usamos dicts con valor None como "sets ordenados": así se mantiene el orden de creación
+_svc_by_uid: dict[str, dict[str, None]] = {}                  # uid -> service_ids
+_acc_by_uid_svc: dict[tuple[str, str], dict[str, None]] = {}  # (uid, service_id) -> account_ids
+_acc_count_by_uid: Counter = Counter()                        # uid -> cantidad de cuentas
+
+
+def _index_service(service_id: str, service: dict):
+    """Agrega un servicio a los índices."""
+    _svc_by_uid.setdefault(service.get('uid'), {})[service_id] = None
+
+
+def _unindex_service(service_id: str, service: dict):
+    """Quita un servicio de los índices (y el grupo del uid si queda vacío)."""
+    uid = service.get('uid')
+    ids = _svc_by_uid.get(uid, {})
+    ids.pop(service_id, None)
+    if not ids:
+        _svc_by_uid.pop(uid, None)
+
+
+def _index_account(account_id: str, account: dict):
+    """Agrega una cuenta a los índices."""
+    _acc_by_uid_svc.setdefault((account.get('uid'), account.get('service_id')), {})[account_id] = None
+    _acc_count_by_uid[account.get('uid')] += 1
+
+
+def _unindex_account(account_id: str, account: dict):
+    """Quita una cuenta de los índices (y los grupos que queden vacíos)."""
+    uid = account.get('uid')
+    key = (uid, account.get('service_id'))
+    ids = _acc_by_uid_svc.get(key, {})
+    if account_id in ids:
+        del ids[account_id]
+        _acc_count_by_uid[uid] -= 1
+
+    # Sin esto, cada servicio o usuario borrado dejaría una entrada vacía para siempre
+    if not ids:
+        _acc_by_uid_svc.pop(key, None)
+    if _acc_count_by_uid[uid] <= 0:
+        _acc_count_by_uid.pop(uid, None)
+
+
+def _build_indexes(filepath: Path, data: dict):
+    """
+    Reconstruye desde cero los índices del archivo que se acaba de leer de disco.
+    Solo pasa cuando el archivo cambió (o no existe), no en cada request.
+    """
+    if filepath == SERVICES_FILE:
+        _svc_by_uid.clear()
+        for service_id, service in data.items():
+            _index_service(service_id, service)
+    elif filepath == ACCOUNTS_FILE:
+        _acc_by_uid_svc.clear()
+        for account_id, account in data.items():
+            _acc_by_uid_svc.setdefault((account.get('uid'), account.get('service_id')), {})[account_id] = None
+        # El contador se arma en una sola pasada con Counter
+        _acc_count_by_uid.clear()
+        _acc_count_by_uid.update(account.get('uid') for account in data.values())
+
+
+# Hash de una contraseña aleatoria que nadie conoce
+# Se usa en el login cuando el usuario no existe, para que esa respuesta
+# tarde lo mismo que una contraseña incorrecta (no revela qué usuarios existen)
+_DUMMY_HASH = hash_password(token_hex(16))
+
+
+def _json_loads(raw: bytes):
+    """Parsea JSON desde bytes, con orjson si está disponible."""
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(data) -> bytes:
+    """Serializa a JSON legible (sangría de 2 espacios, UTF-8), con orjson si está disponible."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
 
 
 def load_json(filepath: Path, default=None):
@@ -114,46 +383,240 @@ def load_json(filepath: Path, default=None):
     Si el archivo no existe o está corrupto, devuelve el valor 'default'.
 
     Esto es útil porque así nunca crashea la app si falta un archivo.
+
+    El resultado se cachea junto con el mtime del archivo: mientras el archivo
+    no se modifique, devolvemos el mismo dict sin volver a leer ni parsear.
+    Si hay cambios pendientes de escribir, la versión en memoria es la buena.
     """
     # Si no pasaron default, usamos un dict vacío
     if default is None:
         default = {}
 
-    # Solo intentamos leer si el archivo realmente existe
-    if filepath.exists():
+    # Todo con el lock tomado: si el archivo cambió, reconstruimos los índices
+    # y no puede haber otro hilo recorriéndolos a la vez
+    with _json_lock:
+        if filepath in _dirty or filepath in _writing:
+            return _json_cache[filepath][1]
+
+        # Un solo os.stat nos dice si el archivo existe y su mtime a la vez
+        # (antes hacíamos exists() + stat(), dos llamadas al sistema)
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)  # convierte el JSON a dict de Python
-        except:
-            # Si el JSON está mal formateado o hay error de lectura,
+            # st_mtime_ns cambia cada vez que alguien escribe el archivo
+            mtime = os.stat(filepath).st_mtime_ns
+        except OSError:
+            # Si el archivo no existe, devolvemos el default
+            _build_indexes(filepath, default)
+            return default
+
+        cached = _json_cache.get(filepath)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            # Abrimos directamente (sin preguntar antes si existe): si lo borraron
+            # justo ahora, open tira FileNotFoundError y caemos en el except
+            with open(filepath, 'rb') as f:
+                # El mtime sale del archivo ya abierto: así el cache guarda el mtime
+                # de exactamente estos bytes, aunque alguien lo reemplace en el medio
+                mtime = os.fstat(f.fileno()).st_mtime_ns
+                # Leemos el archivo entero como bytes y lo parseamos de una
+                data = _json_loads(f.read())  # convierte el JSON a dict de Python
+        except (OSError, ValueError):
+            # Si el JSON está mal formateado (ValueError) o hay error de lectura (OSError),
             # devolvemos el default en vez de crashear toda la app
+            _build_indexes(filepath, default)
             return default
 
-    # Si el archivo no existe, devolvemos el default
-    return default
+        _json_cache[filepath] = (mtime, data)
+        _build_indexes(filepath, data)
+        return data
 
 
 def save_json(filepath: Path, data):
     """
-    Guarda un diccionario Python como archivo JSON en disco.
+    Guarda un diccionario Python como archivo JSON.
+
+    No escribe directamente: actualiza el cache en memoria y marca el archivo
+    como pendiente. El hilo de fondo (_flusher) lo escribe a disco como mucho
+    FLUSH_INTERVAL segundos después, juntando varias escrituras en una sola.
+    Así el request responde sin esperar al disco.
+    """
+    save_json_many((filepath, data))
+
+
+def save_json_many(*items):
+    """
+    Igual que save_json pero para varios archivos: recibe pares (ruta, datos).
+
+    Todos quedan marcados como pendientes a la vez, así el hilo de fondo
+    siempre los escribe en la misma pasada (nunca uno sí y el otro todavía no).
+    """
+    with _json_lock:
+        for filepath, data in items:
+            cached = _json_cache.get(filepath)
+            _json_cache[filepath] = (cached[0] if cached else 0, data)
+            _dirty.add(filepath)
+    _flush_event.set()
+
+
+def _write_json(filepath: Path, data):
+    """
+    Escribe un dict a disco de verdad.
+
+    _json_dumps lo deja legible (sangría de 2 espacios) y en UTF-8,
+    así que caracteres como ñ, á, etc. se guardan tal cual.
+
+    Escribimos primero a un archivo temporal, hacemos fsync para que los bytes
+    estén realmente en disco y recién ahí lo renombramos con os.replace(),
+    que es atómico: aunque se corte la luz, nunca queda un JSON a medio escribir
+    (que load_json leería como vacío, perdiendo todos los datos).
+
+    Después de escribir actualizamos el mtime del cache, así la próxima lectura
+    no tiene que volver a parsear lo que acabamos de guardar.
+    """
+    # Serializamos con el lock tomado para que ningún request modifique el dict
+    # mientras lo recorremos; la escritura al disco ya va sin lock
+    with _json_lock:
+        raw = _json_dumps(data)
+
+    tmp = filepath.with_suffix(filepath.suffix + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filepath)
+
+    mtime = filepath.stat().st_mtime_ns
+    with _json_lock:
+        # Solo si nadie reemplazó el dict mientras escribíamos
+        cached = _json_cache.get(filepath)
+        if cached and cached[1] is data:
+            _json_cache[filepath] = (mtime, data)
+
+
+def flush_json():
+    """
+    Escribe a disco todos los archivos con cambios pendientes.
+    La llama el hilo de fondo y también atexit al cerrar la app.
+    """
+    with _flush_lock:
+        with _json_lock:
+            pending = [(path, _json_cache[path][1]) for path in _dirty]
+            _writing.update(_dirty)
+            _dirty.clear()
+
+        for path, data in pending:
+            try:
+                _write_json(path, data)
+            except OSError as e:
+                # Si falla (disco lleno, permisos...) lo dejamos pendiente para reintentar
+                app.logger.error(f"No se pudo guardar {path}: {e}")
+                with _json_lock:
+                    _dirty.add(path)
+            finally:
+                with _json_lock:
+                    _writing.discard(path)
+
+
+def _flusher():
+    """Hilo de fondo: espera cambios, deja pasar FLUSH_INTERVAL y escribe todo junto."""
+    while True:
+        _flush_event.wait()
+        time.sleep(FLUSH_INTERVAL)  # en esta ventana se acumulan más cambios
+        _flush_event.clear()
+        flush_json()
+
+
+# daemon=True: el hilo no impide que la app se cierre
+# atexit se encarga de escribir lo que haya quedado pendiente
+threading.Thread(target=_flusher, name='json-flusher', daemon=True).start()
+atexit.register(flush_json)
+
+
+def upload_ext(filename):
+    """
+    Devuelve la extensión (en minúsculas) de un archivo subido si está permitida, o None si no.
+
+    Ejemplo: "foto.JPG" -> "jpg"   /   "virus.exe" -> None   /   "sin_extension" -> None
+
+    rpartition('.') divide por el último punto y devuelve siempre una tupla de 3,
+    ej: "foto.min.js" -> ("foto.min", ".", "js"), sin armar una lista como rsplit.
+    Así la extensión se calcula una sola vez y se reutiliza para el nombre del archivo.
+    """
+    if not filename:
+        return None
+    _, dot, ext = filename.rpartition('.')
+    ext = ext.lower()
+    return ext if dot and ext in ALLOWED_EXTENSIONS else None
+
 
-    indent=2 hace que el JSON sea legible (con sangría de 2 espacios)
-    ensure_ascii=False permite guardar caracteres especiales como ñ, á, etc.
+@lru_cache(maxsize=4096)
+def _decrypt_tuple(values: tuple) -> tuple:
     """
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    Desencripta una tupla de valores cifrados y devuelve la tupla descifrada.
+
+    Está memorizada con lru_cache: el texto cifrado de una cuenta no cambia
+    hasta que alguien la edita, así que cada refresco de la lista de cuentas
+    reutiliza el resultado anterior en vez de volver a descifrar.
+    No hace falta invalidar nada a mano: si un campo cambia, cambia su
+    texto cifrado y por lo tanto la clave del cache.
+    """
+    try:
+        # Desencriptamos todos los campos en una sola llamada
+        return tuple(yrz.decrypt_many(values))
+    except Exception:
+        # Si algo falla (por ejemplo, un valor que no estaba encriptado
+        # o datos corruptos), vamos campo por campo y dejamos tal cual el que falle
+        result = []
+        for val in values:
+            try:
+                result.append(yrz.decrypt(val))
+            except Exception:
+                result.append(val)
+        return tuple(result)
+
 
+def _upload_fd(stream):
+    """
+    Devuelve el descriptor del archivo temporal de una subida, o None si la subida está en memoria.
 
-def allowed_file(filename):
+    Werkzeug guarda las subidas chicas en memoria y las grandes (> 500 KiB) en un
+    archivo temporal. Con un SpooledTemporaryFile que todavía está en memoria no
+    pedimos fileno(), porque eso lo obligaría a escribirse a disco.
     """
-    Verifica que el archivo subido tenga una extensión permitida.
+    if isinstance(stream, tempfile.SpooledTemporaryFile) and not stream._rolled:
+        return None
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
 
-    Ejemplo: "foto.jpg" -> True   /   "virus.exe" -> False
 
-    rsplit('.', 1) divide por el último punto, ej: "foto.min.js" -> ["foto.min", "js"]
-    El [1] toma solo la extensión y .lower() la convierte a minúsculas para comparar
+def save_upload(file, target: Path):
+    """
+    Guarda un archivo subido en disco.
+
+    Si la subida ya está en un archivo temporal y el sistema tiene os.sendfile (Linux),
+    el kernel copia de archivo a archivo sin pasar los bytes por Python.
+    Si no (subidas chicas en memoria, Windows), usamos copyfileobj por bloques de 1 MiB,
+    que tampoco carga el archivo entero en memoria.
     """
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    src = file.stream
+    fd = _upload_fd(src) if hasattr(os, 'sendfile') else None
+
+    with open(target, 'wb') as dst:
+        if fd is not None:
+            offset = src.tell()
+            remaining = os.fstat(fd).st_size - offset
+            while remaining > 0:
+                sent = os.sendfile(dst.fileno(), fd, offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+            src.seek(offset)
+        else:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
 
 
 def decrypt_account(account: dict) -> dict:
@@ -177,30 +640,86 @@ def decrypt_account(account: dict) -> dict:
     # .copy() hace una copia superficial del dict para no modificar el original
     decrypted = account.copy()
 
-    for field in encrypted_fields:
-        # .get(field, '') devuelve '' si el campo no existe, evita KeyError
-        val = account.get(field, '')
+    # Solo desencriptamos los campos que tienen valor (no están vacíos)
+    # .get(field, '') devuelve '' si el campo no existe, evita KeyError
+    fields = [field for field in encrypted_fields if account.get(field, '')]
 
-        # Solo intentamos desencriptar si el campo tiene valor (no está vacío)
-        if val:
-            try:
-                decrypted[field] = yrz.decrypt(val)
-            except Exception:
-                # Si algo falla (por ejemplo, un valor que no estaba encriptado
-                # o datos corruptos), dejamos el valor tal cual para no crashear
-                decrypted[field] = val
+    # La tupla de textos cifrados es la clave del cache de _decrypt_tuple
+    decrypted.update(zip(fields, _decrypt_tuple(tuple(account[f] for f in fields))))
 
     return decrypted
 
 
+def account_files(account: dict) -> list:
+    """
+    Devuelve las rutas en disco de todos los archivos de una cuenta: icono + imágenes.
+
+    Las rutas ya están guardadas en la cuenta ('icon' encriptado, 'images' en claro),
+    así que para borrarlos no hace falta buscar nada en la carpeta.
+    """
+    paths = [USER_DOCS / "img" / img_path for img_path in account.get('images', [])]
+    if account.get('icon'):
+        # El icono está encriptado en disco, lo desencriptamos para saber su ruta real
+        paths.append(USER_DOCS / "img" / _decrypt_tuple((account['icon'],))[0])
+    return paths
+
+
+# Pool chico de hilos para el I/O de archivos (guardar subidas, borrar sin bloquear el request)
+# 4 hilos alcanzan para solapar las escrituras y los unlink sin saturar el disco
+_io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='io')
+
+
+def _unlink(path: Path):
+    """Borra un archivo; si ya no existe no pasa nada (missing_ok=True)."""
+    try:
+        path.unlink(missing_ok=True)
+    except OSError as e:
+        app.logger.error(f"No se pudo borrar {path}: {e}")
+
+
+def delete_files(paths):
+    """
+    Manda a borrar una lista de archivos al pool de hilos y vuelve enseguida.
+
+    unlink(missing_ok=True) hace una sola llamada al sistema por archivo,
+    en vez de exists() + unlink().
+    """
+    for path in paths:
+        _io_pool.submit(_unlink, path)
+
+
+# Cache del timestamp actual en formato ISO, con resolución de 1 segundo
+# (segundo (int), texto ISO de ese segundo)
+# Es una tupla que se reemplaza entera: cambiar la variable es atómico en Python,
+# así ningún hilo ve el segundo nuevo con el texto viejo y no hace falta lock
+_TS_CACHE = (0, '')
+
+
+def now_iso() -> str:
+    """
+    Devuelve la fecha/hora actual como "2024-01-15T10:30:00".
+
+    Formatear un datetime no es gratis, así que solo lo hacemos una vez por
+    segundo: si piden la hora varias veces dentro del mismo segundo,
+    devolvemos el mismo string ya armado.
+    """
+    global _TS_CACHE
+    t = int(time.time())
+    cached = _TS_CACHE  # leemos la tupla una sola vez
+    if cached[0] != t:
+        # Si dos hilos llegan a la vez en un segundo nuevo, los dos arman el mismo texto
+        cached = _TS_CACHE = (t, datetime.fromtimestamp(t).isoformat())
+    return cached[1]
+
+
 def generate_uid():
     """
     Genera un identificador único para cada usuario.
 
-    secrets.token_hex(16) crea una cadena hexadecimal aleatoria de 32 caracteres.
+    token_hex(16) crea una cadena hexadecimal aleatoria de 32 caracteres.
     La probabilidad de colisión (que dos usuarios tengan el mismo uid) es prácticamente cero.
     """
-    return secrets.token_hex(16)
+    return token_hex(16)
 
 
 # ============================================================
@@ -219,6 +738,15 @@ def index():
     return render_template('index.html')
 
 
+@app.errorhandler(413)
+def too_large(e):
+    """
+    Respuesta cuando la subida supera MAX_CONTENT_LENGTH.
+    Devolvemos JSON como el resto de la API, no la página HTML de error de Flask.
+    """
+    return jsonify({'success': False, 'error': 'Archivo demasiado grande'}), 413
+
+
 # ----- AUTENTICACIÓN -----
 
 @app.route('/api/auth/check', methods=['GET'])
@@ -227,11 +755,13 @@ def check_auth():
     Verifica si ya existe al menos un usuario registrado.
     El frontend lo usa para saber si debe mostrar login o registro.
     """
-    credentials = load_json(CREDENTIALS_FILE, {})
+    with _json_lock:
+        credentials = load_json(CREDENTIALS_FILE, {})
+        users = list(credentials.keys())  # lista de nombres de usuario registrados
 
     return jsonify({
-        'exists': len(credentials) > 0,    # True si hay usuarios, False si está vacío
-        'users': list(credentials.keys())  # lista de nombres de usuario registrados
+        'exists': len(users) > 0,  # True si hay usuarios, False si está vacío
+        'users': users
     })
 
 
@@ -250,19 +780,37 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
+    # Si falta la contraseña (o no es texto) la tratamos como vacía: falla como
+    # cualquier contraseña incorrecta (401) y el scrypt se corre igual
+    if not isinstance(password, str):
+        password = ''
+
     credentials = load_json(CREDENTIALS_FILE, {})
 
-    # Primero verificamos que el usuario exista, luego comparamos hashes
+    # Siempre corremos la verificación, aunque el usuario no exista (contra _DUMMY_HASH),
+    # así el tiempo de respuesta no delata si el usuario existe o no
     # Nunca comparamos passwords en texto plano, siempre hashes
-    if username in credentials:
-        if credentials[username]['password'] == hash_password(password):
-            return jsonify({
-                'success': True,
-                'uid': credentials[username]['uid'],
-                'email': credentials[username].get('email', ''),
-                'username': username,
-                'avatar': credentials[username].get('avatar', None)
-            })
+    stored = credentials[username]['password'] if username in credentials else _DUMMY_HASH
+    if verify_password(username, password, stored) and username in credentials:
+        # Migración: si el usuario todavía tenía el hash SHA-256 viejo,
+        # lo reemplazamos por scrypt ahora que conocemos la contraseña
+        if isinstance(stored, str):
+            new_hash = hash_password(password)  # lo lento, fuera del lock
+            with _json_lock:
+                # releemos dentro del lock
+                credentials = load_json(CREDENTIALS_FILE, {})
+                # Solo si todavía tiene el mismo hash viejo (nadie lo cambió en el medio)
+                if username in credentials and credentials[username]['password'] == stored:
+                    credentials[username]['password'] = new_hash
+                    save_json(CREDENTIALS_FILE, credentials)
+
+        return jsonify({
+            'success': True,
+            'uid': credentials[username]['uid'],
+            'email': credentials[username].get('email', ''),
+            'username': username,
+            'avatar': credentials[username].get('avatar', None)
+        })
 
     # Si llegamos aquí es porque el usuario no existe o la contraseña es incorrecta
     # Devolvemos el mismo mensaje para ambos casos (seguridad: no revelar cuál falló)
@@ -281,24 +829,32 @@ def register():
     password = data.get('password')
     email = data.get('email', '')  # email es opcional, por defecto string vacío
 
-    credentials = load_json(CREDENTIALS_FILE, {})
-
     # No permitimos usuarios duplicados
-    if username in credentials:
+    if username in load_json(CREDENTIALS_FILE, {}):
         return jsonify({'success': False, 'error': 'Usuario ya existe'}), 400
 
     # Generamos el uid antes de guardar para tenerlo disponible
     uid = generate_uid()
 
-    # Guardamos el usuario - OJO: nunca guardamos la password real, solo su hash
-    credentials[username] = {
-        'password': hash_password(password),        # hash irreversible
-        'uid': uid,
-        'email': email,
-        'created_at': datetime.now().isoformat()    # fecha en formato "2024-01-15T10:30:00"
-    }
+    # El hash es lo lento del registro: lo calculamos antes de tomar el lock
+    password_hash = hash_password(password)  # hash irreversible
+
+    with _json_lock:
+        credentials = load_json(CREDENTIALS_FILE, {})
+
+        # Volvemos a mirar: otro request pudo registrar el mismo usuario mientras hasheábamos
+        if username in credentials:
+            return jsonify({'success': False, 'error': 'Usuario ya existe'}), 400
+
+        # Guardamos el usuario - OJO: nunca guardamos la password real, solo su hash
+        credentials[username] = {
+            'password': password_hash,
+            'uid': uid,
+            'email': email,
+            'created_at': now_iso()                 # fecha en formato "2024-01-15T10:30:00"
+        }
 
-    save_json(CREDENTIALS_FILE, credentials)
+        save_json(CREDENTIALS_FILE, credentials)
 
     # En la respuesta sí devolvemos los datos (sin el hash de contraseña)
     return jsonify({
@@ -327,12 +883,27 @@ def update_password():
         return jsonify({'success': False, 'error': 'Usuario no existe'}), 404
 
     # Verificamos que la contraseña actual sea correcta antes de permitir el cambio
-    if credentials[username]['password'] != hash_password(old_password):
+    if not verify_password(username, old_password, credentials[username]['password']):
         return jsonify({'success': False, 'error': 'Contraseña actual incorrecta'}), 401
 
     # Guardamos el hash de la nueva contraseña
-    credentials[username]['password'] = hash_password(new_password)
-    save_json(CREDENTIALS_FILE, credentials)
+    # y olvidamos la verificación cacheada de la contraseña anterior
+    with _verifier_lock:
+        _verifier_cache.pop((username, fast_digest(old_password.encode())), None)
+    stored = credentials[username]['password']
+    new_hash = hash_password(new_password)  # lo lento, fuera del lock
+    with _json_lock:
+        # releemos dentro del lock
+        credentials = load_json(CREDENTIALS_FILE, {})
+        if username not in credentials:
+            return jsonify({'success': False, 'error': 'Usuario no existe'}), 404
+
+        # Si otro request cambió la contraseña mientras tanto, la que verificamos ya no vale
+        if credentials[username]['password'] != stored:
+            return jsonify({'success': False, 'error': 'Contraseña actual incorrecta'}), 401
+
+        credentials[username]['password'] = new_hash
+        save_json(CREDENTIALS_FILE, credentials)
 
     return jsonify({'success': True})
 
@@ -347,14 +918,15 @@ def update_email():
     username = data.get('username')
     email = data.get('email')
 
-    credentials = load_json(CREDENTIALS_FILE, {})
+    with _json_lock:
+        credentials = load_json(CREDENTIALS_FILE, {})
 
-    if username not in credentials:
-        return jsonify({'success': False, 'error': 'Usuario no existe'}), 404
+        if username not in credentials:
+            return jsonify({'success': False, 'error': 'Usuario no existe'}), 404
 
-    # Simplemente sobreescribimos el campo email
-    credentials[username]['email'] = email
-    save_json(CREDENTIALS_FILE, credentials)
+        # Simplemente sobreescribimos el campo email
+        credentials[username]['email'] = email
+        save_json(CREDENTIALS_FILE, credentials)
 
     return jsonify({'success': True})
 
@@ -379,31 +951,35 @@ def update_avatar():
     if 'avatar' in request.files:
         file = request.files['avatar']
 
-        # Verificamos que sea una extensión permitida
-        if file and allowed_file(file.filename):
+        # Sacamos la extensión del nombre original y verificamos que esté permitida
+        ext = upload_ext(file.filename) if file else None
+        if ext:
             uid = credentials[username]['uid']
 
-            # Sacamos la extensión del nombre original del archivo
-            # rsplit('.', 1) divide por el último punto: "foto.min.jpg" -> ["foto.min", "jpg"]
-            ext = file.filename.rsplit('.', 1)[1].lower()
+            # Nombramos el archivo con el uid + un token corto: cada avatar nuevo tiene
+            # una URL nueva, así el navegador no muestra el viejo que tiene en cache
+            filename = f"avatar_{uid}_{token_hex(4)}.{ext}"
 
-            # Nombramos el archivo con el uid para que sea único por usuario
-            filename = f"avatar_{uid}.{ext}"
+            # Guardamos el nuevo archivo en disco (fuera del lock, puede tardar)
+            save_upload(file, IMG_AVATARS / filename)
 
-            # Borramos el avatar anterior si existía para no acumular archivos huérfanos
-            old_avatar = credentials[username].get('avatar')
-            if old_avatar:
-                old_file = USER_DOCS / "img" / old_avatar
-                if old_file.exists():
-                    old_file.unlink()  # .unlink() es el equivalente de "borrar archivo" en Path
+            with _json_lock:
+                # releemos dentro del lock
+                credentials = load_json(CREDENTIALS_FILE, {})
+                if username not in credentials:
+                    delete_files([IMG_AVATARS / filename])  # no dejamos el archivo huérfano
+                    return jsonify({'success': False, 'error': 'Usuario no existe'}), 404
 
-            # Guardamos el nuevo archivo en disco
-            file.save(IMG_AVATARS / filename)
+                # Borramos el avatar anterior si existía para no acumular archivos huérfanos
+                # (delete_files usa unlink(missing_ok=True): si ya no estaba, no pasa nada)
+                old_avatar = credentials[username].get('avatar')
+                if old_avatar:
+                    delete_files([USER_DOCS / "img" / old_avatar])
 
-            # Guardamos la ruta relativa (no absoluta) en el JSON
-            # así funciona aunque la app se mueva de carpeta
-            credentials[username]['avatar'] = f"avatars/{filename}"
-            save_json(CREDENTIALS_FILE, credentials)
+                # Guardamos la ruta relativa (no absoluta) en el JSON
+                # así funciona aunque la app se mueva de carpeta
+                credentials[username]['avatar'] = f"avatars/{filename}"
+                save_json(CREDENTIALS_FILE, credentials)
 
             return jsonify({
                 'success': True,
@@ -423,11 +999,12 @@ def get_services():
     uid viene como query param en la URL: /api/services?uid=abc123
     """
     uid = request.args.get('uid')  # request.args = query params de la URL
-    services = load_json(SERVICES_FILE, {})
+    with _json_lock:
+        services = load_json(SERVICES_FILE, {})
 
-    # Filtramos solo los servicios de este usuario usando dict comprehension
-    # Es equivalente a un for loop que va armando un dict nuevo
-    user_services = {k: v for k, v in services.items() if v.get('uid') == uid}
+        # Tomamos solo los servicios de este usuario usando el índice uid -> service_ids
+        # así no recorremos los servicios de todos los demás usuarios
+        user_services = {k: services[k] for k in _svc_by_uid.get(uid, ())}
 
     return jsonify(user_services)
 
@@ -445,36 +1022,37 @@ def create_service():
     if not uid or not name:
         return jsonify({'success': False, 'error': 'Datos incompletos'}), 400
 
-    services = load_json(SERVICES_FILE, {})
-
     # El ID del servicio combina uid + token aleatorio para que sea único globalmente
-    service_id = f"{uid}_{secrets.token_hex(8)}"
+    service_id = f"{uid}_{token_hex(8)}"
 
     # El icono del servicio es opcional
     icon_path = None
     if 'icon' in request.files:
         file = request.files['icon']
-        if file and allowed_file(file.filename):
-            ext = file.filename.rsplit('.', 1)[1].lower()
+        ext = upload_ext(file.filename) if file else None
+        if ext:
             filename = f"{service_id}.{ext}"
-            file.save(IMG_SERVICES / filename)
+            save_upload(file, IMG_SERVICES / filename)
             icon_path = f"services/{filename}"  # ruta relativa para guardar en JSON
 
     # Guardamos el servicio - los datos de servicios NO se encriptan
     # porque el nombre del servicio no es sensible (ej: "Gmail" no es un secreto)
-    services[service_id] = {
+    service = {
         'name': name,
         'uid': uid,
         'icon': icon_path,
-        'created_at': datetime.now().isoformat()
+        'created_at': now_iso()
     }
-
-    save_json(SERVICES_FILE, services)
+    with _json_lock:
+        services = load_json(SERVICES_FILE, {})
+        services[service_id] = service
+        _index_service(service_id, service)
+        save_json(SERVICES_FILE, services)
 
     return jsonify({
         'success': True,
         'service_id': service_id,
-        'service': services[service_id]
+        'service': service
     })
 
 
@@ -486,36 +1064,48 @@ def delete_service(service_id):
 
     service_id viene en la URL: DELETE /api/services/abc123_xyz
     """
-    services = load_json(SERVICES_FILE, {})
+    # Todo el borrado en cascada con el lock tomado: ningún otro request ve
+    # el servicio borrado a medias (sin servicio pero todavía con cuentas)
+    with _json_lock:
+        services = load_json(SERVICES_FILE, {})
 
-    if service_id not in services:
-        return jsonify({'success': False, 'error': 'Servicio no encontrado'}), 404
+        if service_id not in services:
+            return jsonify({'success': False, 'error': 'Servicio no encontrado'}), 404
+
+        # Juntamos todos los archivos a borrar y los borramos de una al final
+        files_to_delete = []
+
+        # El icono del servicio
+        if services[service_id].get('icon'):
+            files_to_delete.append(USER_DOCS / "img" / services[service_id]['icon'])
+
+        # Buscamos y borramos todas las cuentas que pertenecen a este servicio
+        accounts = load_json(ACCOUNTS_FILE, {})
 
-    # Borramos el icono del servicio del disco si existe
-    if services[service_id].get('icon'):
-        icon_file = USER_DOCS / "img" / services[service_id]['icon']
-        if icon_file.exists():
-            icon_file.unlink()
+        # El índice (uid, service_id) ya nos da los IDs de las cuentas de este servicio,
+        # sin recorrer las cuentas de todos los usuarios
+        # list() hace una copia porque _unindex_account modifica el índice mientras iteramos
+        uid = services[service_id].get('uid')
+        accounts_to_delete = list(_acc_by_uid_svc.get((uid, service_id), ()))
 
-    # Buscamos y borramos todas las cuentas que pertenecen a este servicio
-    accounts = load_json(ACCOUNTS_FILE, {})
+        for acc_id in accounts_to_delete:
+            # También borramos el icono y las imágenes de esa cuenta del disco
+            # usando las rutas guardadas en la cuenta (sin escanear la carpeta)
+            files_to_delete.extend(account_files(accounts[acc_id]))
+            _unindex_account(acc_id, accounts[acc_id])
+            del accounts[acc_id]
 
-    # Primero hacemos una lista de los IDs a borrar (no podemos borrar mientras iteramos)
-    accounts_to_delete = [k for k, v in accounts.items() if v.get('service_id') == service_id]
+        _unindex_service(service_id, services[service_id])
+        del services[service_id]
 
-    for acc_id in accounts_to_delete:
-        # También borramos las imágenes de esa cuenta del disco
-        acc_dir = IMG_ACCOUNTS / accounts[acc_id]['uid']
-        if acc_dir.exists():
-            # glob busca archivos que coincidan con el patrón
-            for img_file in acc_dir.glob(f"{service_id}_*"):
-                img_file.unlink()
-        del accounts[acc_id]
+        # Guardamos los archivos JSON ya sin los datos borrados, todavía con el lock tomado:
+        # si no, el hilo de fondo podría escribir justo en el medio y marcar el cache
+        # como igual al disco sin que estos cambios estén pendientes
+        # Los dos quedan marcados juntos y el hilo de fondo los escribe en la misma pasada
+        save_json_many((ACCOUNTS_FILE, accounts), (SERVICES_FILE, services))
 
-    # Guardamos los archivos JSON ya sin los datos borrados
-    save_json(ACCOUNTS_FILE, accounts)
-    del services[service_id]
-    save_json(SERVICES_FILE, services)
+    # Los archivos se borran en paralelo en el pool de hilos
+    delete_files(files_to_delete)
 
     return jsonify({'success': True})
 
@@ -533,14 +1123,14 @@ def get_accounts():
     service_id = request.args.get('service_id')
     uid = request.args.get('uid')
 
-    accounts = load_json(ACCOUNTS_FILE, {})
+    with _json_lock:
+        accounts = load_json(ACCOUNTS_FILE, {})
 
-    # Filtramos las cuentas que pertenecen a este usuario y servicio
-    # y las desencriptamos con decrypt_account() antes de devolverlas
-    filtered = {
-        k: decrypt_account(v) for k, v in accounts.items()
-        if v.get('service_id') == service_id and v.get('uid') == uid
-    }
+        # Tomamos las cuentas de este usuario y servicio desde el índice
+        # y las desencriptamos con decrypt_account() antes de devolverlas
+        filtered = {
+            k: decrypt_account(accounts[k]) for k in _acc_by_uid_svc.get((uid, service_id), ())
+        }
 
     return jsonify(filtered)
 
@@ -578,45 +1168,70 @@ def create_account():
     if not inicio_servicio and not password:
         return jsonify({'success': False, 'error': 'Debe proporcionar contraseña'}), 400
 
-    accounts = load_json(ACCOUNTS_FILE, {})
+    # El servicio tiene que existir y ser de este usuario
+    # (así tampoco se puede usar un uid inventado para escribir en otra carpeta)
+    with _json_lock:
+        load_json(SERVICES_FILE, {})  # asegura que el índice de servicios esté al día con el disco
+        service_exists = service_id in _svc_by_uid.get(uid, ())
+    if not service_exists:
+        return jsonify({'success': False, 'error': 'Servicio no encontrado'}), 404
+
+    # Si no pusieron nombre, usamos username, y si tampoco, usamos email
+    display_name = name if name else (username if username else email)
 
     # ID único para esta cuenta
-    account_id = f"{uid}_{secrets.token_hex(8)}"
+    account_id = f"{uid}_{token_hex(8)}"
 
-    # Preparamos la carpeta de imágenes para este usuario
-    acc_img_dir = IMG_ACCOUNTS / uid
-    acc_img_dir.mkdir(parents=True, exist_ok=True)
+    # Primero armamos la lista de archivos a guardar, sin tocar el disco todavía
+    uploads = []  # pares (archivo subido, nombre destino)
 
     # Procesamos el icono de la cuenta (opcional)
     icon_path = None
     if 'icon' in request.files:
         file = request.files['icon']
-        if file and file.filename and allowed_file(file.filename):
-            ext = file.filename.rsplit('.', 1)[1].lower()
+        ext = upload_ext(file.filename) if file else None
+        if ext:
             filename = f"{account_id}_icon.{ext}"
-            file.save(acc_img_dir / filename)
+            uploads.append((file, filename))
             icon_path = f"accounts/{uid}/{filename}"
 
     # Procesamos imágenes adicionales (capturas de pantalla, etc.)
-    images = []
-    for i, key in enumerate(request.files.keys()):
-        if key.startswith('image_'):  # solo procesamos claves que empiecen con "image_"
-            file = request.files[key]
-            if file and file.filename and allowed_file(file.filename):
-                ext = file.filename.rsplit('.', 1)[1].lower()
-                filename = f"{service_id}_{i}.{ext}"
-                file.save(acc_img_dir / filename)
-                images.append(f"accounts/{uid}/{filename}")
+    # Solo las claves que empiezan con "image_" (el icono va aparte)
+    # request.files mantiene el orden en que el frontend las agregó al FormData,
+    # así que las imágenes quedan en el mismo orden en que se eligieron
+    # (ordenar los nombres como texto pondría "image_10" antes que "image_2")
+    image_keys = [key for key in request.files if key.startswith('image_')]
 
-    # Si no pusieron nombre, usamos username, y si tampoco, usamos email
-    display_name = name if name else (username if username else email)
+    images = []
+    for key in image_keys:
+        file = request.files[key]
+        ext = upload_ext(file.filename) if file else None
+        if ext:
+            # Token aleatorio en el nombre: dos cuentas del mismo servicio
+            # nunca se pisan las imágenes entre sí
+            filename = f"{service_id}_{token_hex(4)}.{ext}"
+            uploads.append((file, filename))
+            images.append(f"accounts/{uid}/{filename}")
+
+    # Recién ahora, con todo validado, escribimos al disco
+    # La carpeta de imágenes del usuario solo se crea si hay algo que guardar
+    if uploads:
+        acc_img_dir = IMG_ACCOUNTS / uid
+        acc_img_dir.mkdir(parents=True, exist_ok=True)
+        if len(uploads) == 1:
+            save_upload(uploads[0][0], acc_img_dir / uploads[0][1])
+        else:
+            # Cada archivo es independiente: los copiamos en paralelo en el pool de hilos
+            # (el GIL se suelta durante el I/O, así las escrituras se solapan)
+            # list() espera a que terminen todas y relanza el error si alguna falla
+            list(_io_pool.map(lambda upload: save_upload(upload[0], acc_img_dir / upload[1]), uploads))
 
     # ============================================================
     # AQUÍ SE ENCRIPTA TODO ANTES DE GUARDAR EN DISCO
     # La condición "if campo else ''" evita encriptar strings vacíos
     # porque yrz.encrypt('') podría generar valores raros en algunos cifrados
     # ============================================================
-    accounts[account_id] = {
+    account = {
         'uid': uid,
         'service_id': service_id,
         'name':            yrz.encrypt(display_name)         if display_name    else '',
@@ -626,17 +1241,21 @@ def create_account():
         'inicio_servicio': yrz.encrypt(str(inicio_servicio)) if inicio_servicio else '',
         'icon':            yrz.encrypt(icon_path)            if icon_path       else '',
         'images':          images,              # las rutas de imágenes no se encriptan
-        'created_at':      datetime.now().isoformat()
+        'created_at':      now_iso()
     }
 
     # Guardamos en disco (encriptado)
-    save_json(ACCOUNTS_FILE, accounts)
+    with _json_lock:
+        accounts = load_json(ACCOUNTS_FILE, {})
+        accounts[account_id] = account
+        _index_account(account_id, account)
+        save_json(ACCOUNTS_FILE, accounts)
 
     # Devolvemos al frontend la cuenta DESENCRIPTADA para que la muestre de inmediato
     return jsonify({
         'success': True,
         'account_id': account_id,
-        'account': decrypt_account(accounts[account_id])  # <- desencriptamos antes de enviar
+        'account': decrypt_account(account)  # <- desencriptamos antes de enviar
     })
 
 
@@ -648,26 +1267,29 @@ def update_account(account_id):
     Solo actualiza los campos que vengan en el request (no sobreescribe todo).
     Al guardar encripta, al responder desencripta.
     """
-    accounts = load_json(ACCOUNTS_FILE, {})
+    with _json_lock:
+        accounts = load_json(ACCOUNTS_FILE, {})
+
+        # Verificamos que la cuenta que quieren editar exista
+        if account_id not in accounts:
+            return jsonify({'success': False, 'error': 'Cuenta no encontrada'}), 404
 
-    # Verificamos que la cuenta que quieren editar exista
-    if account_id not in accounts:
-        return jsonify({'success': False, 'error': 'Cuenta no encontrada'}), 404
+        # Solo actualizamos los campos que llegaron en el form
+        # Si un campo no llega, se queda como estaba (no lo tocamos)
+        if 'username' in request.form:
+            accounts[account_id]['username'] = yrz.encrypt(request.form['username'])
+        if 'password' in request.form:
+            accounts[account_id]['password'] = yrz.encrypt(request.form['password'])
+        if 'email' in request.form:
+            accounts[account_id]['email'] = yrz.encrypt(request.form['email'])
 
-    # Solo actualizamos los campos que llegaron en el form
-    # Si un campo no llega, se queda como estaba (no lo tocamos)
-    if 'username' in request.form:
-        accounts[account_id]['username'] = yrz.encrypt(request.form['username'])
-    if 'password' in request.form:
-        accounts[account_id]['password'] = yrz.encrypt(request.form['password'])
-    if 'email' in request.form:
-        accounts[account_id]['email'] = yrz.encrypt(request.form['email'])
+        # Guardamos los cambios en disco (encriptados)
+        save_json(ACCOUNTS_FILE, accounts)
 
-    # Guardamos los cambios en disco (encriptados)
-    save_json(ACCOUNTS_FILE, accounts)
+        # Respondemos con la cuenta desencriptada para que el frontend la muestre actualizada
+        account = decrypt_account(accounts[account_id])
 
-    # Respondemos con la cuenta desencriptada para que el frontend la muestre actualizada
-    return jsonify({'success': True, 'account': decrypt_account(accounts[account_id])})
+    return jsonify({'success': True, 'account': account})
 
 
 @app.route('/api/accounts/<account_id>', methods=['DELETE'])
@@ -675,30 +1297,19 @@ def delete_account(account_id):
     """
     Elimina una cuenta y todas sus imágenes del disco.
     """
-    accounts = load_json(ACCOUNTS_FILE, {})
+    with _json_lock:
+        accounts = load_json(ACCOUNTS_FILE, {})
 
-    if account_id not in accounts:
-        return jsonify({'success': False, 'error': 'Cuenta no encontrada'}), 404
+        if account_id not in accounts:
+            return jsonify({'success': False, 'error': 'Cuenta no encontrada'}), 404
 
-    uid = accounts[account_id]['uid']
-    acc_dir = IMG_ACCOUNTS / uid  # carpeta de imágenes de este usuario
+        # Borramos el icono y las imágenes adicionales de la cuenta (en el pool de hilos)
+        delete_files(account_files(accounts[account_id]))
 
-    # Borramos el icono de la cuenta si existe
-    if accounts[account_id].get('icon'):
-        icon_file = USER_DOCS / "img" / accounts[account_id]['icon']
-        if icon_file.exists():
-            icon_file.unlink()  # .unlink() borra el archivo del disco
-
-    # Borramos las imágenes adicionales
-    # .get con default [] evita KeyError si la clave 'images' no existe
-    for img_path in accounts[account_id].get('images', []):
-        img_file = USER_DOCS / "img" / img_path
-        if img_file.exists():
-            img_file.unlink()
-
-    # Borramos la cuenta del dict y guardamos
-    del accounts[account_id]
-    save_json(ACCOUNTS_FILE, accounts)
+        # Borramos la cuenta del dict (y de los índices) y guardamos
+        _unindex_account(account_id, accounts[account_id])
+        del accounts[account_id]
+        save_json(ACCOUNTS_FILE, accounts)
 
     return jsonify({'success': True})
 
@@ -710,26 +1321,92 @@ def count_accounts():
     Útil para mostrar estadísticas en el dashboard.
     """
     uid = request.args.get('uid')
-    accounts = load_json(ACCOUNTS_FILE, {})
+    with _json_lock:
+        load_json(ACCOUNTS_FILE, {})  # asegura que los índices estén al día con el disco
 
-    # Contamos cuántas cuentas tienen este uid usando una generator expression
-    # Es como un for loop compacto que va sumando 1 por cada cuenta que coincide
-    count = sum(1 for v in accounts.values() if v.get('uid') == uid)
+        # El contador por uid se mantiene al crear/borrar cuentas, no hace falta recorrer nada
+        # Counter devuelve 0 si el uid no tiene cuentas
+        count = _acc_count_by_uid[uid]
 
     return jsonify({'count': count})
 
 
 # ----- IMÁGENES -----
 
+# Cuánto tiempo (en segundos) puede el navegador reutilizar una imagen sin preguntar
+IMG_MAX_AGE = 86400  # 1 día
+
+# Cache LRU en memoria de las imágenes más pedidas: ruta -> (mtime_ns, bytes, mimetype)
+# OrderedDict mantiene el orden de uso: la menos usada queda al principio y es la que se saca
+_img_cache: OrderedDict = OrderedDict()
+_img_lock = threading.Lock()
+IMG_CACHE_SIZE = 200                  # máximo de imágenes en cache
+IMG_CACHE_MAX_BYTES = 1024 * 1024     # imágenes más grandes que esto no se cachean (1 MiB)
+
+
+def _read_image(path: str, size: int) -> bytes:
+    """Lee una imagen completa mapeando el archivo a memoria con mmap."""
+    if size == 0:
+        return b''  # mmap no acepta archivos vacíos
+    with open(path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+        return bytes(mm)
+
+
 @app.route('/img/<path:filename>')
 def serve_image(filename):
     """
     Sirve archivos de imagen desde la carpeta de imágenes del usuario.
 
     <path:filename> captura rutas con subdirectorios, ej: "avatars/foto.jpg"
-    send_from_directory maneja los headers HTTP correctos para archivos estáticos.
+
+    Las imágenes chicas se guardan en un cache LRU en memoria (leídas con mmap),
+    así los avatares e iconos que se piden en cada página no se vuelven a leer
+    del disco. Si el archivo cambia en disco (otro mtime), se vuelve a leer.
+    Las imágenes grandes se mandan con send_from_directory como siempre.
+
+    ETag/Last-Modified + make_conditional: si el navegador ya tiene la imagen
+    recibe un 304 sin cuerpo. Además, cada archivo subido tiene un nombre único
+    (los ids y el token del avatar cambian en cada subida), así que su contenido
+    nunca cambia y podemos marcarlo como immutable.
     """
-    return send_from_directory(USER_DOCS / "img", filename)
+    # safe_join devuelve None si la ruta intenta salir de la carpeta de imágenes
+    path = safe_join(str(USER_DOCS / "img"), filename)
+    if path is None:
+        abort(404)
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        abort(404)
+    if not stat.S_ISREG(st.st_mode):
+        abort(404)
+
+    if st.st_size > IMG_CACHE_MAX_BYTES:
+        response = send_from_directory(USER_DOCS / "img", filename, conditional=True, max_age=IMG_MAX_AGE)
+    else:
+        with _img_lock:
+            cached = _img_cache.get(path)
+            if cached and cached[0] == st.st_mtime_ns:
+                _img_cache.move_to_end(path)  # la marcamos como recién usada
+
+        if cached and cached[0] == st.st_mtime_ns:
+            _, data, mimetype = cached
+        else:
+            data = _read_image(path, st.st_size)
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            with _img_lock:
+                _img_cache[path] = (st.st_mtime_ns, data, mimetype)
+                _img_cache.move_to_end(path)
+                if len(_img_cache) > IMG_CACHE_SIZE:
+                    _img_cache.popitem(last=False)  # sacamos la menos usada
+
+        response = Response(data, mimetype=mimetype)
+        response.last_modified = st.st_mtime
+        response.set_etag(f"{st.st_mtime_ns}-{st.st_size}")
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    response.headers['Cache-Control'] = f'public, max-age={IMG_MAX_AGE}, immutable'
+    return response
 
 
 # ============================================================
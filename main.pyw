@@ -30,6 +30,12 @@ except ImportError:
     os.system("pip install pystray")
     import pystray
 
+try:
+    from waitress import serve
+except ImportError:
+    os.system("pip install waitress")
+    from waitress import serve
+
 from alejandra_manager import app, init_directories
 
 # Tema dark
@@ -138,7 +144,7 @@ class LauncherSimple:
             print(f"❌ Error: {e}")
             
     def run_flask(self):
-        """Ejecuta Flask"""
+        """Ejecuta Flask sobre waitress (servidor WSGI de producción con pool de hilos)"""
         try:
             time.sleep(2)
             print(f"✅ Servidor iniciado en http://{ip}:{self.port}")
@@ -147,12 +153,13 @@ class LauncherSimple:
             webbrowser.open(f'http://{ip}:{self.port}')
             
             # Ejecutar Flask sin mostrar consola
-            app.run(
-                debug=False,
+            # waitress atiende varios requests a la vez con un pool de hilos,
+            # a diferencia del servidor de desarrollo de Werkzeug
+            serve(
+                app,
+                host=ip,
                 port=self.port,
-                use_reloader=False,
-                threaded=True,
-                host=ip
+                threads=8
             )
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -1,5 +1,6 @@
 import json
 import os
+import re
 import sys
 
 # ── Ruta compatible con PyInstaller (_MEIPASS) y ejecución normal ──
@@ -16,7 +17,10 @@ ruta = os.path.join(base_dir, "yrz_codek.json")
 with open(ruta, "r", encoding="utf-8") as f:
     data = json.load(f)
 
+# Solo usamos "cifrado"; "metadata" y "cifrado_por_grupo" (la misma tabla partida
+# por idioma) se descartan para no tenerlos en memoria toda la vida del proceso
 cifrado = data["cifrado"]
+del data
 
 # Normalizar claves especiales a sus caracteres reales
 if "SPACE"   in cifrado: cifrado[" "]  = cifrado.pop("SPACE")
@@ -26,36 +30,70 @@ if "NEWLINE" in cifrado: cifrado["\n"] = cifrado.pop("NEWLINE")
 # Diccionario invertido para descifrar
 descifrado = {v: k for k, v in cifrado.items()}
 
+# Tabla para str.translate (ord del carácter -> código) y set de caracteres con código
+_TRANS = {ord(k): v for k, v in cifrado.items() if len(k) == 1}
+_MAPEADOS = frozenset(cifrado)
+
+# Parte un texto en bloques de 3 caracteres (re.S para que "." acepte también saltos de línea)
+_TRIPLES = re.compile("...", re.S)
+
+# El descifrado rápido por triples solo es correcto si la tabla es "perfecta":
+# todos los códigos miden 3, no se repiten (la inversión no pierde nada)
+# y ninguno contiene "[" (así "[" en el texto siempre marca un escape "[?...]")
+# Se verifica una sola vez al importar; si el JSON no cumple, se usa el camino lento
+_TABLA_PERFECTA = (
+    len(descifrado) == len(cifrado)
+    and all(len(v) == 3 and "[" not in v for v in descifrado)
+)
+
 
 # ── Funciones ─────────────────────────────────────────────────────
 def encrypt(texto):
     """Convierte cada carácter a su código de 3 símbolos."""
-    resultado = ""
-    for char in texto:
-        if char in cifrado:
-            resultado += cifrado[char]
-        else:
-            resultado += f"[?{char}]"   # carácter no mapeado, se preserva
-    return resultado
+    # Caso normal: todos los caracteres tienen código -> translate recorre el texto en C
+    if _MAPEADOS.issuperset(texto):
+        return texto.translate(_TRANS)
+    # Hay caracteres no mapeados: una sola pasada acumulando en lista y join al final
+    buscar = cifrado.get
+    return "".join([buscar(char) or f"[?{char}]" for char in texto])   # no mapeado, se preserva
 
 
 def decrypt(texto):
     """Recorre el texto de 3 en 3 y lo convierte de vuelta al original."""
-    resultado = ""
+    # Caso normal: sin "[?...]" (ningún código usa "[") y largo múltiplo de 3
+    # -> partimos en triples y buscamos todos de una con map, sin loop en Python
+    if _TABLA_PERFECTA and "[" not in texto and len(texto) % 3 == 0:
+        originales = list(map(descifrado.get, _TRIPLES.findall(texto)))
+        if None not in originales:
+            return "".join(originales)
+
+    # Caso general: hay escapes o triples desconocidos
+    # Acumulamos en una lista y unimos al final: sumar strings con += es O(n²)
+    partes = []
+    agregar = partes.append
+    buscar = descifrado.get
+    n = len(texto)
     i = 0
-    while i < len(texto):
+    while i < n:
         # Carácter no mapeado entre corchetes
-        if texto[i] == "[" and i + 2 < len(texto) and texto[i+1] == "?":
-            fin = texto.index("]", i)
-            resultado += texto[i+2:fin]
+        # El "]" se busca desde i+2: en i e i+1 ya sabemos que hay "[?"
+        # (index se frena en el primer "]", así que cada escape se recorre una sola vez)
+        if texto[i] == "[" and i + 2 < n and texto[i+1] == "?":
+            fin = texto.index("]", i + 2)
+            agregar(texto[i+2:fin])
             i = fin + 1
             continue
         # Leer de 3 en 3
-        triple = texto[i:i+3]
-        if triple in descifrado:
-            resultado += descifrado[triple]
+        original = buscar(texto[i:i+3])
+        if original is not None:
+            agregar(original)
             i += 3
         else:
-            resultado += texto[i]   # carácter suelto inesperado
+            agregar(texto[i])   # carácter suelto inesperado
             i += 1
-    return resultado
\ No newline at end of file
+    return "".join(partes)
+
+
+def decrypt_many(textos):
+    """Descifra una lista de textos de una sola vez, en el mismo orden."""
+    return [decrypt(t) for t in textos]